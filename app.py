@@ -3,10 +3,28 @@ import pdfplumber
 import pandas as pd
 import re
 import io
+import math
+import importlib.util
+import os
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import pytesseract
-from pdf2image import convert_from_bytes
+import pypdfium2 as pdfium
 from PIL import Image
+import numpy as np
+
+# Each Tesseract engine would otherwise start its own OpenMP thread pool,
+# oversubscribing the cores that the OCR workers already keep busy.
+# Set before tesserocr loads libtesseract, and inherited by pytesseract's subprocesses
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+# tesserocr runs Tesseract in-process when installed; otherwise pytesseract starts a process per page
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
 
 # Set page configuration
 st.set_page_config(
@@ -83,323 +101,591 @@ HEADER_PATTERNS = [
     "MONETARY POLITICAL CONTRIBUTIONS"
 ]
 
-def is_footer_text(text):
-    """Check if text contains footer patterns"""
-    if not text:
-        return False
-    text_lower = text.lower()
-    for pattern in FOOTER_PATTERNS:
-        if pattern.lower() in text_lower:
-            return True
-    return False
-
-def is_header_text(text):
-    """Check if text contains header patterns"""
-    if not text:
-        return False
-    for pattern in HEADER_PATTERNS:
-        if pattern in text:
-            return True
-    return False
+# Output columns, in display order (the street address is parsed but not exported)
+CONTRIBUTION_COLUMNS = [
+    "Date",
+    "Contributor Name",
+    "City",
+    "State",
+    "Zip",
+    "Amount",
+    "Occupation",
+    "Employer",
+    "Page"
+]
+
+# Regular expressions are compiled once here instead of on every line
+# Start of a contribution: Date, Name, and Amount on one line ($ optional for OCR robustness)
+CONTRIBUTION_RE = re.compile(r'(\d{2}/\d{2}/\d{4})\s+(.+?)\s+\$?([\d,]+\.\d{2})')
+# Looser date ... amount check used to find where the next contribution starts
+NEXT_CONTRIBUTION_RE = re.compile(r'\d{2}/\d{2}/\d{4}\s+.*?\d+\.\d{2}')
+CONTRIBUTOR_ID_RE = re.compile(r'\(ID#:.*?\)')
+DATE_RE = re.compile(r'\d{2}/\d{2}/\d{4}')
+AMOUNT_RE = re.compile(r'\d+\.\d{2}')
+STATE_NUMBER_RE = re.compile(r'[A-Z]{2}\s+\d')  # "TX 7..." anywhere in the line
+# Address-like line, checked in a single pass with .match():
+# "123 Main St" or similar | "City, ST" without zip | "TX 77027" or similar
+ADDRESS_LINE_RE = re.compile(r'\d+\s+[A-Za-z]|[A-Za-z\s]+,\s*[A-Z]{2}$|[A-Z]{2}\s+\d{5}')
+CITY_STATE_ZIP_RE = re.compile(r'([A-Za-z\s]+),\s*([A-Z]{2})\s*(\d{5}(?:-\d{4})?)')
+# Footer/header text can appear anywhere in a line; footers match in any case
+FOOTER_RE = re.compile('|'.join(re.escape(pattern) for pattern in FOOTER_PATTERNS), re.IGNORECASE)
+HEADER_RE = re.compile('|'.join(re.escape(pattern) for pattern in HEADER_PATTERNS))
+# Every check of should_skip_line fused into one search. At the start of the line:
+# page numbers like "1.0", "Sch: 1/5 Rpt: 4/23", "3 of 23", or an address-like line.
+# Anywhere in the line: footer text (any case) or header text
+SKIP_LINE_RE = re.compile(
+    r'^(?:\d+\.\d+$|Sch:.*Rpt:|\d+ of \d+$|' + ADDRESS_LINE_RE.pattern + ')'
+    + '|(?i:' + FOOTER_RE.pattern + ')|' + HEADER_RE.pattern
+)
 
+# Scanned pages are rasterized and OCR'd this many at a time
+OCR_BATCH_SIZE = 8
+
+# Resolution scanned pages are rendered at for OCR
+OCR_DPI = 300
+
+# EasyOCR's text detector sees this many pages per forward pass, each scaled to at most
+# GPU_CANVAS_SIZE pixels on its long side. Its first layer alone keeps 64 float32 values
+# per pixel, about 0.3 GB per letter page at this size (recognition still reads the full page)
+GPU_DETECT_PAGES = 2
+GPU_CANVAS_SIZE = 1280
+
+# Lower resolution for the quick Tesseract pass that finds Schedule A1 pages,
+# about a quarter of the pixels; the form titles are large enough to read at this size
+PROBE_DPI = 150
+# Loose on purpose (case, spacing) since low resolution OCR is rough
+PROBE_MARKER_RE = re.compile(r'MONETARY\s+POLITICAL\s+CONTRIBUTIONS|Schedule\s+A1', re.IGNORECASE)
+
+# Roughly how many times the progress bar is redrawn during the native text pass
+PROGRESS_UPDATES = 20
+
+# Tesseract runs as a subprocess (or inside tesserocr, which releases the GIL),
+# so threads OCR pages in parallel across cores.
+# One core is left for the main thread, which renders the next batch meanwhile
+OCR_WORKERS = max(1, (os.cpu_count() or 1) - 1)
+
+# --oem 1 uses only the LSTM engine (skips loading the legacy one)
+# --psm 6 assumes a single uniform block of text
+TESSERACT_CONFIG = '--oem 1 --psm 6'
+
+# Header and footer lines repeat on every page of a filing, so remember the answers
+@lru_cache(maxsize=4096)
 def should_skip_line(text):
     """Determine if a line should be skipped when looking for occupation/employer"""
     if not text or text.strip() == "":
         return True
-    if is_footer_text(text):
-        return True
-    if is_header_text(text):
-        return True
-    if re.match(r'^\d+\.\d+$', text):  # Page numbers like "1.0"
-        return True
-    if re.match(r'^Sch:.*Rpt:', text):  # "Sch: 1/5 Rpt: 4/23"
-        return True
-    if re.match(r'^\d+ of \d+$', text):  # "3 of 23"
-        return True
-    
-    # Additional checks for address-like patterns
-    # Check for street address patterns
-    if re.match(r'^\d+\s+[A-Za-z]', text):  # "123 Main St" or similar
-        return True
-    if re.match(r'^[A-Za-z\s]+,\s*[A-Z]{2}$', text):  # "City, ST" without zip
-        return True
-    if re.match(r'^[A-Z]{2}\s+\d{5}', text):  # "TX 77027" or similar
-        return True
-    
-    return False
+    # Footers, headers, page numbers and address-like lines in a single regex pass
+    return SKIP_LINE_RE.search(text) is not None
 
-def get_text_from_page(page, pdf_bytes, page_num):
+def get_native_text(page):
+    """Extract the embedded text layer of a page (fast, accurate for digital PDFs)"""
+    try:
+        return page.extract_text() or ""
+    except:
+        return ""
+
+def needs_ocr(text):
+    """A page with no substantial native text is treated as a scan"""
+    return not (text and len(text.strip()) > 50)
+
+def batch_pages(page_nums, batch_size=OCR_BATCH_SIZE):
     """
-    Try to extract text normally. If empty, perform OCR.
+    Split page numbers into batches of at most batch_size pages.
+    PDFium renders any list of pages, so the pages in a batch need not be adjacent.
     """
-    # 1. Try native extraction (fast, accurate for digital PDFs)
+    return [page_nums[i:i + batch_size] for i in range(0, len(page_nums), batch_size)]
+
+# EasyOCR is only used when a CUDA GPU is available; otherwise Tesseract does the OCR.
+# torch and easyocr take seconds and hundreds of MB to import, so they are imported
+# here on first use instead of at startup (cache_resource keeps the answer across reruns)
+@st.cache_resource(show_spinner=False)
+def gpu_ocr_available():
+    """Check whether EasyOCR is installed and a CUDA device is usable"""
+    if importlib.util.find_spec('easyocr') is None:
+        return False
     try:
-        text = page.extract_text()
-    except:
-        text = ""
-    
-    # 2. If text is found and looks substantial, return it
-    if text and len(text.strip()) > 50:
-        return text
+        import torch
+    except ImportError:
+        return False
+    return torch.cuda.is_available()
 
-    # 3. Fallback: OCR (Scanned PDF)
-    # Note: This requires Tesseract and Poppler installed on the system
+@st.cache_resource(show_spinner=False)
+def get_ocr_reader():
+    """Load the EasyOCR reader on the GPU. Returns None when no CUDA device is available."""
+    if not gpu_ocr_available():
+        return None
+    import torch
+    import easyocr
+    # cudnn_benchmark lets cuDNN pick the fastest convolution kernels once, then reuse them
+    reader = easyocr.Reader(['en'], gpu=True, cudnn_benchmark=True)
+    # Warm up on blank letter-size pages so kernel selection happens here, once,
+    # instead of on the first real batch. It is only a speedup: if it fails
+    # (e.g. out of GPU memory), the reader is still returned and used
+    width, height = int(8.5 * OCR_DPI), 11 * OCR_DPI
     try:
-        # Convert specific page to image (page_num is 0-indexed, pdf2image uses 1-indexed)
-        images = convert_from_bytes(
-            pdf_bytes, 
-            first_page=page_num+1, 
-            last_page=page_num+1,
-            dpi=300
-        )
-        
-        if images:
-            # Use Tesseract to get text
-            # --psm 6 assumes a single uniform block of text
-            ocr_text = pytesseract.image_to_string(images[0], config='--psm 6') 
-            return ocr_text
+        easyocr_texts(reader, [np.zeros((height, width), dtype=np.uint8)] * GPU_DETECT_PAGES)
     except Exception as e:
-        # If OCR fails (usually missing dependencies), return empty string so the loop continues
-        print(f"OCR Failed for page {page_num}: {e}")
-        return ""
+        print(f"EasyOCR warmup failed: {e}")
+        torch.cuda.empty_cache()
+    return reader
+
+def boxes_to_text(results):
+    """
+    Rebuild text lines from EasyOCR boxes so the parser sees the same
+    line layout that Tesseract produces.
+    """
+    lines = []
+    # Sort boxes top to bottom by their vertical centre
+    for bbox, text, _ in sorted(results, key=lambda r: r[0][0][1] + r[0][2][1]):
+        top, bottom = bbox[0][1], bbox[2][1]
+        centre = (top + bottom) / 2
+        # Boxes whose centres are within half a box height share a line
+        if lines and centre - lines[-1][0] < (bottom - top) / 2:
+            lines[-1][1].append((bbox[0][0], text))
+        else:
+            lines.append([centre, [(bbox[0][0], text)]])
     
-    return ""
+    return "\n".join(" ".join(text for _, text in sorted(words)) for _, words in lines)
+
+# PDFium is not thread-safe, not even across separate documents, and Streamlit runs each
+# session's script in its own thread: every pypdfium2 call goes through this lock
+PDFIUM_LOCK = threading.Lock()
+
+# One tesserocr engine per OCR worker thread; an engine must not be shared between threads
+tesseract_local = threading.local()
+
+def tesseract_text(image):
+    """Run Tesseract on a single page image"""
+    if tesserocr is not None:
+        # Keep the engine loaded between pages instead of starting a tesseract
+        # process and reloading the model for every page
+        api = getattr(tesseract_local, 'api', None)
+        if api is None:
+            # Same settings as TESSERACT_CONFIG: LSTM engine only, single uniform block of text
+            api = tesseract_local.api = tesserocr.PyTessBaseAPI(
+                lang='eng', psm=tesserocr.PSM.SINGLE_BLOCK, oem=tesserocr.OEM.LSTM_ONLY
+            )
+        api.SetImage(image)
+        return api.GetUTF8Text()
+    return pytesseract.image_to_string(image, lang='eng', config=TESSERACT_CONFIG)
+
+def render_page(render_pdf, page_num, dpi=OCR_DPI):
+    """
+    Render a page for OCR as a numpy array.
+    Grayscale: one byte per pixel instead of three; Tesseract and EasyOCR's
+    recognizer only look at luminance anyway.
+    """
+    with PDFIUM_LOCK:
+        page = render_pdf[page_num]
+        try:
+            bitmap = page.render(scale=dpi / 72, grayscale=True)
+            # The pixel buffer is allocated by Python, so the array stays valid after the
+            # bitmap is closed; closing here keeps the free under the lock too
+            pixels = bitmap.to_numpy()
+            bitmap.close()
+        finally:
+            page.close()
+    return pixels
+
+def easyocr_texts(reader, arrays):
+    """Run EasyOCR on a batch of page arrays. Returns one text per page."""
+    texts = [""] * len(arrays)
+    # readtext_batched scales every image in a call to one size, so pages are grouped
+    # by size first; a landscape page is never squashed into a portrait one
+    by_shape = {}
+    for index, array in enumerate(arrays):
+        by_shape.setdefault(array.shape[:2], []).append(index)
+    
+    for (height, width), indices in by_shape.items():
+        # Detection runs on a few pages at a time, at a capped size,
+        # so the detector's activations fit in GPU memory
+        for start in range(0, len(indices), GPU_DETECT_PAGES):
+            chunk = indices[start:start + GPU_DETECT_PAGES]
+            results = reader.readtext_batched([arrays[index] for index in chunk], n_width=width, n_height=height,
+                                              batch_size=16, canvas_size=GPU_CANVAS_SIZE)
+            for index, result in zip(chunk, results):
+                texts[index] = boxes_to_text(result)
+    return texts
+
+def submit_ocr_batch(executor, reader, render_pdf, batch, dpi, failed_pages):
+    """
+    Rasterize a batch of pages in-process with PDFium and queue them for OCR.
+    Rendering happens on the calling thread, since PDFium is not thread-safe.
+    Returns (rendered, arrays, futures): the positions in the batch that rendered,
+    their page arrays, and the futures for their text. A page that fails to render
+    is reported, added to failed_pages and left out, so it costs only itself.
+    """
+    # Note: This requires Tesseract installed on the system
+    rendered, arrays = [], []
+    for pos, page_num in enumerate(batch):
+        try:
+            # PDFium renders in-process: no Poppler subprocess or image file round trip
+            arrays.append(render_page(render_pdf, page_num, dpi))
+            rendered.append(pos)
+        except Exception as e:
+            print(f"OCR Failed for page {page_num}: {e}")
+            failed_pages.append(page_num)
+    
+    if reader is not None:
+        # GPU: EasyOCR is much faster than Tesseract when CUDA is available.
+        # It takes the numpy arrays directly, with no PIL copy in between
+        futures = [executor.submit(easyocr_texts, reader, arrays)] if arrays else []
+    else:
+        # CPU: Use Tesseract to get text, one page per worker
+        futures = [executor.submit(tesseract_text, Image.fromarray(array)) for array in arrays]
+    return rendered, arrays, futures
+
+def collect_ocr_batch(reader, batch, submitted, failed_pages):
+    """
+    Wait for a submitted batch. Returns one text per page in the batch;
+    a page whose OCR failed gets an empty string and is added to failed_pages,
+    the others keep their text.
+    """
+    rendered, arrays, futures = submitted
+    texts = [""] * len(batch)
+    
+    if reader is not None:
+        if not futures:
+            return texts
+        try:
+            results = futures[0].result()
+        except Exception:
+            # The batch failed as a whole; redo it page by page so a bad page costs only itself
+            results = []
+            for pos, array in zip(rendered, arrays):
+                try:
+                    results.extend(easyocr_texts(reader, [array]))
+                except Exception as e:
+                    print(f"OCR Failed for page {batch[pos]}: {e}")
+                    failed_pages.append(batch[pos])
+                    results.append("")
+        for pos, text in zip(rendered, results):
+            texts[pos] = text
+    else:
+        for pos, future in zip(rendered, futures):
+            try:
+                texts[pos] = future.result()
+            except Exception as e:
+                # If OCR fails (usually missing dependencies), leave the page empty so the loop continues
+                print(f"OCR Failed for page {batch[pos]}: {e}")
+                failed_pages.append(batch[pos])
+    
+    return texts
+
+def ocr_batches(executor, workers, reader, render_pdf, batches, failed_pages, dpi=OCR_DPI):
+    """
+    OCR batches of pages on the executor (which has `workers` threads), yielding
+    (batch, texts) in order. reader is the EasyOCR reader, or None for Tesseract.
+    Pages whose OCR fails are added to failed_pages.
+    The next batch is rendered while the earlier ones are still being recognized,
+    so rasterization and OCR overlap instead of taking turns.
+    """
+    # Enough batches in flight to keep every worker busy, plus one rendered ahead;
+    # no more, so rendered pages don't pile up in memory
+    max_in_flight = -(-workers // OCR_BATCH_SIZE) + 1
+    pending = []
+    for batch in batches:
+        pending.append((batch, submit_ocr_batch(executor, reader, render_pdf, batch, dpi, failed_pages)))
+        if len(pending) >= max_in_flight:
+            batch, submitted = pending.pop(0)
+            yield batch, collect_ocr_batch(reader, batch, submitted, failed_pages)
+    for batch, submitted in pending:
+        yield batch, collect_ocr_batch(reader, batch, submitted, failed_pages)
+
+class OCRIncompleteError(Exception):
+    """
+    Raised by the cached extraction when OCR failed on some pages, so that
+    st.cache_data doesn't keep the partial result. Carries that result.
+    """
+    def __init__(self, contributions, failed_pages):
+        super().__init__(f"OCR failed on {len(failed_pages)} page(s)")
+        self.contributions = contributions
+        self.failed_pages = failed_pages
 
 def extract_schedule_a1_from_pdf(pdf_file):
     """Extract Schedule A1 data from uploaded PDF (Digital or Scanned)"""
-    all_contributions = []
-    
     try:
-        # Get raw bytes for OCR usage
-        pdf_bytes = pdf_file.getvalue()
+        return extract_schedule_a1_from_bytes(pdf_file.getvalue()), None
+    except OCRIncompleteError as e:
+        # Show what was found, but the run wasn't cached, so extracting again retries the OCR
+        pages = ", ".join(str(page_num + 1) for page_num in sorted(set(e.failed_pages)))
+        st.warning(f"⚠️ OCR failed on page(s) {pages}; the results below may be incomplete. "
+                   "Extract again to retry.")
+        return e.contributions, None
+    except Exception as e:
+        return None, f"Error processing PDF: {str(e)}"
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def extract_schedule_a1_from_bytes(pdf_bytes):
+    """
+    Extract Schedule A1 contributions from raw PDF bytes.
+    Cached on the file contents, so extracting the same upload again is free.
+    """
+    # One list per column; pandas builds the DataFrame straight from these
+    contributions = {column: [] for column in CONTRIBUTION_COLUMNS}
+    seen = set()
+    # Pages whose rendering or OCR failed; a run with any is not cached
+    failed_pages = []
+    
+    # Open PDF with pdfplumber using BytesIO
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        total_pages = len(pdf.pages)
         
-        # Open PDF with pdfplumber using BytesIO
-        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-            total_pages = len(pdf.pages)
-            
-            # Progress bar setup
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            
-            for page_num in range(total_pages):
-                # Update progress
+        # Progress bar setup
+        progress_bar = st.progress(0)
+        status_text = st.empty()
+        
+        # 1. Native text for every page
+        page_texts = []
+        progress_step = max(1, total_pages // PROGRESS_UPDATES)
+        for page_num, page in enumerate(pdf.pages):
+            # Update progress every few pages; each update is a round trip to the browser
+            if page_num % progress_step == 0 or page_num == total_pages - 1:
                 status_text.text(f"Processing page {page_num + 1} of {total_pages}...")
                 progress_bar.progress((page_num + 1) / total_pages)
+            
+            page_texts.append(get_native_text(page))
+            # Drop the page's cached layout objects; only its text is kept
+            page.flush_cache()
+        
+        # 2. Fallback: OCR the scanned pages in batches
+        ocr_pages = [n for n, text in enumerate(page_texts) if needs_ocr(text)]
+        if ocr_pages:
+            # Parse the document for rendering once for all batches,
+            # and only when some page actually needs OCR
+            with PDFIUM_LOCK:
+                render_pdf = pdfium.PdfDocument(pdf_bytes)
+            reader = get_ocr_reader()
+            # The GPU takes one batch at a time; Tesseract gets a worker per core.
+            # One pool serves both passes, so each worker's Tesseract engine is loaded once
+            workers = 1 if reader is not None else OCR_WORKERS
+            try:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    # Tesseract: a quick low resolution pass first, so only Schedule A1
+                    # pages pay for the full resolution OCR below
+                    if reader is None:
+                        status_text.text(f"Looking for Schedule A1 in {len(ocr_pages)} scanned page(s)...")
+                        pages_done = 0
+                        for batch, texts in ocr_batches(executor, workers, None, render_pdf,
+                                                        batch_pages(ocr_pages), failed_pages, dpi=PROBE_DPI):
+                            pages_done += len(batch)
+                            progress_bar.progress(pages_done / len(ocr_pages))
+                            
+                            for page_num, text in zip(batch, texts):
+                                page_texts[page_num] = text
+                        ocr_pages = [n for n in ocr_pages if PROBE_MARKER_RE.search(page_texts[n])]
+                    
+                    # Progress follows pages as their OCR finishes, not batches as they start.
+                    # Name the OCR device, so a deployment that fell back to CPU OCR is visible
+                    ocr_device = "cuda (EasyOCR)" if reader is not None else "cpu (Tesseract)"
+                    status_text.text(f"Running OCR on {len(ocr_pages)} page(s), {ocr_device}...")
+                    pages_done = 0
+                    for batch, texts in ocr_batches(executor, workers, reader, render_pdf, batch_pages(ocr_pages), failed_pages):
+                        pages_done += len(batch)
+                        status_text.text(f"Running OCR on {ocr_device}: {pages_done} of {len(ocr_pages)} page(s) done...")
+                        progress_bar.progress(pages_done / len(ocr_pages))
+                        
+                        for page_num, text in zip(batch, texts):
+                            page_texts[page_num] = text
+            finally:
+                with PDFIUM_LOCK:
+                    render_pdf.close()
+        
+        # 3. Parse the relevant pages
+        for page_num, text in enumerate(page_texts):
+            if not text:
+                continue
+
+            # Check if this page is relevant
+            if "MONETARY POLITICAL CONTRIBUTIONS" in text or "Schedule A1" in text:
                 
-                page = pdf.pages[page_num]
+                # Split into lines and clean (each line is stripped once)
+                lines = [stripped for line in text.split('\n') if (stripped := line.strip())]
                 
-                # Intelligent Extraction (Native or OCR)
-                text = get_text_from_page(page, pdf_bytes, page_num)
+                # Flag the lines that start a contribution once per page, so the
+                # lookaheads below index into this list instead of re-running the regex
+                contribution_starts = [bool(NEXT_CONTRIBUTION_RE.search(line)) for line in lines]
                 
-                if not text:
-                    continue
-
-                # Check if this page is relevant
-                if "MONETARY POLITICAL CONTRIBUTIONS" in text or "Schedule A1" in text:
+                # Likewise flag complete "City, ST 7xxxx" addresses, and address-like lines
+                # of any kind (complete address, street, "City, ST", or just state and zip)
+                full_address_flags = [',' in line and STATE_NUMBER_RE.search(line) is not None for line in lines]
+                address_flags = [full or ADDRESS_LINE_RE.match(line) is not None
+                                 for full, line in zip(full_address_flags, lines)]
+                
+                i = 0
+                while i < len(lines):
+                    line = lines[i]
                     
-                    # Split into lines and clean
-                    lines = [line.strip() for line in text.split('\n') if line.strip()]
+                    # Regex to find the start of a contribution
+                    # Looks for Date, Name, and Amount on one line
+                    # Modified to make $ optional (\$) for OCR robustness
+                    date_match = CONTRIBUTION_RE.search(line)
                     
-                    i = 0
-                    while i < len(lines):
-                        line = lines[i]
+                    if date_match:
+                        date = date_match.group(1)
+                        name_and_maybe_more = date_match.group(2)
+                        amount = float(date_match.group(3).replace(',', '')) # formatted as currency in main()
                         
-                        # Regex to find the start of a contribution
-                        # Looks for Date, Name, and Amount on one line
-                        # Modified to make $ optional (\$) for OCR robustness
-                        date_match = re.search(r'(\d{2}/\d{2}/\d{4})\s+(.+?)\s+\$?([\d,]+\.\d{2})', line)
+                        # Clean name
+                        name = name_and_maybe_more
+                        name = CONTRIBUTOR_ID_RE.sub('', name).strip()
                         
-                        if date_match:
-                            date = date_match.group(1)
-                            name_and_maybe_more = date_match.group(2)
-                            amount = f"${date_match.group(3)}" # standardize currency
-                            
-                            # Clean name
-                            name = name_and_maybe_more
-                            name = re.sub(r'\(ID#:.*?\)', '', name).strip()
-                            
-                            # Initialize variables
-                            address = "No Data"
-                            city = "No Data"
-                            state = "No Data"
-                            zipcode = "No Data"
-                            occupation = "No Data"
-                            employer = "No Data"
-                            
-                            # MODIFIED: Look for address in next 5 lines, handling multi-line addresses
-                            address_lines = []
-                            max_address_lines = 5  # Maximum lines to check for address
-                            
-                            for j in range(1, max_address_lines + 1):
-                                if i + j >= len(lines):
-                                    break
-                                    
-                                test_line = lines[i + j]
-                                
-                                # Skip empty lines
-                                if not test_line.strip():
-                                    if address_lines:  # If we already have address lines, stop
-                                        break
-                                    else:
-                                        continue
-                                
-                                # Check for address patterns
-                                is_address_line = False
-                                
-                                # Pattern 1: Complete address with city, state, zip
-                                if ',' in test_line and re.search(r'[A-Z]{2}\s+\d', test_line):
-                                    is_address_line = True
-                                
-                                # Pattern 2: Street address (starts with number)
-                                elif re.match(r'^\d+\s+[A-Za-z]', test_line):
-                                    is_address_line = True
-                                
-                                # Pattern 3: City, State (without zip)
-                                elif re.match(r'^[A-Za-z\s]+,\s*[A-Z]{2}$', test_line):
-                                    is_address_line = True
-                                
-                                # Pattern 4: Just state and zip
-                                elif re.match(r'^[A-Z]{2}\s+\d{5}', test_line):
-                                    is_address_line = True
+                        # Initialize variables
+                        address = "No Data"
+                        city = "No Data"
+                        state = "No Data"
+                        zipcode = "No Data"
+                        occupation = "No Data"
+                        employer = "No Data"
+                        
+                        # MODIFIED: Look for address in next 5 lines, handling multi-line addresses
+                        address_lines = []
+                        max_address_lines = 5  # Maximum lines to check for address
+                        
+                        for j in range(1, max_address_lines + 1):
+                            if i + j >= len(lines):
+                                break
                                 
-                                if is_address_line:
-                                    address_lines.append(test_line)
-                                elif address_lines:
-                                    # If we already started collecting address lines and this doesn't look like address, stop
-                                    break
+                            test_line = lines[i + j]
                             
-                            # Combine address lines
-                            if address_lines:
-                                address = " ".join(address_lines).strip()
-                                
-                                # Try to parse the complete address
-                                # Look for city, state, zip pattern in the combined address
-                                addr_match = re.search(r'([A-Za-z\s]+),\s*([A-Z]{2})\s*(\d{5}(?:-\d{4})?)', address)
-                                if addr_match:
-                                    city = addr_match.group(1).strip()
-                                    state = addr_match.group(2).strip()
-                                    zipcode = addr_match.group(3).strip()
-                                else:
-                                    # If no match, try to extract what we can
-                                    addr_parts = address.split(',')
-                                    if len(addr_parts) >= 2:
-                                        city = addr_parts[0].strip()
-                                        state_zip = addr_parts[1].strip()
-                                        sz_parts = state_zip.split()
-                                        if len(sz_parts) >= 2:
-                                            state = sz_parts[0]
-                                            zipcode = sz_parts[1]
-                            
-                            # MODIFIED: Skip address lines when searching for occupation/employer
-                            address_line_count = len(address_lines)
-                            search_start = i + address_line_count + 1
-                            search_end = min(i + 15, len(lines))
-                            
-                            # Look for next contribution to know where to stop
-                            next_contribution_idx = -1
-                            for j in range(search_start, min(i + 20, len(lines))):
-                                if re.search(r'\d{2}/\d{2}/\d{4}\s+.*?\d+\.\d{2}', lines[j]):
-                                    next_contribution_idx = j
-                                    search_end = min(search_end, next_contribution_idx)
+                            # Skip empty lines
+                            if not test_line.strip():
+                                if address_lines:  # If we already have address lines, stop
                                     break
-                            
-                            # Gather potential occupation/employer lines (skip address lines)
-                            potential_data_lines = []
-                            for j in range(search_start, search_end):
-                                test_line = lines[j]
-                                
-                                # Use helper to skip headers, footers
-                                if should_skip_line(test_line):
-                                    continue
-                                
-                                # Skip if this line was part of address
-                                if address_lines and test_line in address_lines:
-                                    continue
-                                
-                                # Skip lines that look like dates/amounts
-                                if re.search(r'\d{2}/\d{2}/\d{4}', test_line) and re.search(r'\d+\.\d{2}', test_line):
-                                    continue
-                                
-                                # Skip lines that look like addresses
-                                if ',' in test_line and re.search(r'[A-Z]{2}\s+\d', test_line):
+                                else:
                                     continue
-                                
-                                potential_data_lines.append(test_line)
                             
-                            # Logic to assign occupation/employer from found lines
-                            if potential_data_lines:
-                                if len(potential_data_lines) == 1:
-                                    data_line = potential_data_lines[0]
-                                    if ' ' in data_line:
-                                        parts = data_line.split(maxsplit=1)
-                                        if len(parts) == 2:
-                                            occupation = parts[0]
-                                            employer = parts[1]
-                                    else:
-                                        occupation = data_line
-                                elif len(potential_data_lines) >= 2:
-                                    occupation = potential_data_lines[0]
-                                    employer = potential_data_lines[1]
+                            # Check for address patterns (flagged once per page above)
+                            if address_flags[i + j]:
+                                address_lines.append(test_line)
+                            elif address_lines:
+                                # If we already started collecting address lines and this doesn't look like address, stop
+                                break
+                        
+                        # Combine address lines
+                        if address_lines:
+                            address = " ".join(address_lines).strip()
                             
-                            # Final cleanup
-                            for pattern in HEADER_PATTERNS:
-                                if occupation: 
-                                    occupation = occupation.replace(pattern, "").strip()
-                                if employer: 
-                                    employer = employer.replace(pattern, "").strip()
+                            # Try to parse the complete address
+                            # Look for city, state, zip pattern in the combined address
+                            addr_match = CITY_STATE_ZIP_RE.search(address)
+                            if addr_match:
+                                city = addr_match.group(1).strip()
+                                state = addr_match.group(2).strip()
+                                zipcode = addr_match.group(3).strip()
+                            else:
+                                # If no match, try to extract what we can
+                                addr_parts = address.split(',')
+                                if len(addr_parts) >= 2:
+                                    city = addr_parts[0].strip()
+                                    state_zip = addr_parts[1].strip()
+                                    sz_parts = state_zip.split()
+                                    if len(sz_parts) >= 2:
+                                        state = sz_parts[0]
+                                        zipcode = sz_parts[1]
+                        
+                        # MODIFIED: Skip address lines when searching for occupation/employer
+                        address_line_count = len(address_lines)
+                        search_start = i + address_line_count + 1
+                        search_end = min(i + 15, len(lines))
+                        
+                        # Look for next contribution to know where to stop
+                        next_contribution_idx = -1
+                        for j in range(search_start, min(i + 20, len(lines))):
+                            if contribution_starts[j]:
+                                next_contribution_idx = j
+                                search_end = min(search_end, next_contribution_idx)
+                                break
+                        
+                        # Gather the first two potential occupation/employer lines (skip address lines)
+                        occ_line = emp_line = None
+                        for j in range(search_start, search_end):
+                            test_line = lines[j]
                             
-                            if occupation in ["()", "(", ")", "No Data"]: 
-                                occupation = "No Data"
-                            if employer in ["()", "(", ")", "No Data"]: 
-                                employer = "No Data"
-                            if not occupation: 
-                                occupation = "No Data"
-                            if not employer: 
-                                employer = "No Data"
+                            # Use helper to skip headers, footers
+                            if should_skip_line(test_line):
+                                continue
                             
-                            all_contributions.append({
-                                'Date': date,
-                                'Contributor Name': name,
-                                # 'Address': address,
-                                'City': city,
-                                'State': state,
-                                'Zip': zipcode,
-                                'Amount': amount,
-                                'Occupation': occupation,
-                                'Employer': employer,
-                                'Page': page_num + 1
-                            })
+                            # Skip if this line was part of address
+                            if address_lines and test_line in address_lines:
+                                continue
                             
-                            # Skip ahead - include address lines in skip count
-                            skip_amount = max(1, address_line_count + 1)
+                            # Skip lines that look like dates/amounts
+                            if DATE_RE.search(test_line) and AMOUNT_RE.search(test_line):
+                                continue
                             
-                            # Try to find the next date line to skip accurately
-                            for j in range(i + skip_amount, min(i + 10, len(lines))):
-                                if re.search(r'\d{2}/\d{2}/\d{4}\s+.*?\d+\.\d{2}', lines[j]):
-                                    skip_amount = j - i
-                                    break
+                            # Skip lines that look like addresses
+                            if full_address_flags[j]:
+                                continue
                             
-                            i += skip_amount
+                            if occ_line is None:
+                                occ_line = test_line
+                            else:
+                                # Only two lines are ever used, so stop looking
+                                emp_line = test_line
+                                break
+                        
+                        # Logic to assign occupation/employer from found lines
+                        if emp_line is not None:
+                            occupation = occ_line
+                            employer = emp_line
+                        elif occ_line is not None:
+                            if ' ' in occ_line:
+                                parts = occ_line.split(maxsplit=1)
+                                if len(parts) == 2:
+                                    occupation = parts[0]
+                                    employer = parts[1]
+                            else:
+                                occupation = occ_line
+                        
+                        # Final cleanup: strip any header text in one regex pass
+                        if occupation: 
+                            occupation = HEADER_RE.sub("", occupation).strip()
+                        if employer: 
+                            employer = HEADER_RE.sub("", employer).strip()
+                        
+                        if occupation in ["()", "(", ")", "No Data"]: 
+                            occupation = "No Data"
+                        if employer in ["()", "(", ")", "No Data"]: 
+                            employer = "No Data"
+                        if not occupation: 
+                            occupation = "No Data"
+                        if not employer: 
+                            employer = "No Data"
+                        
+                        # Skip duplicates (same date, name and amount) as they are found
+                        key = (date, name, amount)
+                        if key not in seen:
+                            seen.add(key)
+                            contributions['Date'].append(date)
+                            contributions['Contributor Name'].append(name)
+                            contributions['City'].append(city)
+                            contributions['State'].append(state)
+                            contributions['Zip'].append(zipcode)
+                            contributions['Amount'].append(amount)
+                            contributions['Occupation'].append(occupation)
+                            contributions['Employer'].append(employer)
+                            contributions['Page'].append(page_num + 1)
+                        
+                        # Skip ahead - straight to the next contribution when it is close,
+                        # otherwise past the address lines
+                        if next_contribution_idx != -1 and next_contribution_idx < i + 10:
+                            skip_amount = next_contribution_idx - i
                         else:
-                            i += 1
-            
-            # Clear progress bar
-            status_text.empty()
-            progress_bar.empty()
-
-        # Remove duplicates
-        unique_contributions = []
-        seen = set()
-        for contrib in all_contributions:
-            key = (contrib['Date'], contrib['Contributor Name'], contrib['Amount'])
-            if key not in seen:
-                seen.add(key)
-                unique_contributions.append(contrib)
-        
-        return unique_contributions, None
+                            skip_amount = address_line_count + 1
+                        
+                        i += skip_amount
+                    else:
+                        i += 1
         
-    except Exception as e:
-        return None, f"Error processing PDF: {str(e)}"
+        # Clear progress bar
+        status_text.empty()
+        progress_bar.empty()
+
+    if failed_pages:
+        # Raising keeps st.cache_data from storing a result that a retry could improve
+        raise OCRIncompleteError(contributions, failed_pages)
+    return contributions
 
 def main():
     # Header
@@ -434,15 +720,21 @@ def main():
                 
                 if error:
                     st.error(f"❌ {error}")
-                    st.warning("Ensure Poppler and Tesseract-OCR are installed on the system.")
-                elif not contributions:
+                    st.warning("Ensure Tesseract-OCR is installed on the system.")
+                elif not contributions['Date']:
                     st.warning("⚠️ No Schedule A1 data found in the uploaded PDF.")
                 else:
                     # Create DataFrame
                     df = pd.DataFrame(contributions)
                     
+                    # Amounts arrive as numbers: keep those for the total and the Excel export,
+                    # and show them as standardized "$1,234.56" strings in the preview and the CSV
+                    amount_values = df['Amount']
+                    df['Amount'] = amount_values.map('${:,.2f}'.format)
+                    
                     # Sort by date and page
-                    df['Date'] = pd.to_datetime(df['Date'], format='%m/%d/%Y', errors='coerce')
+                    # cache=True parses each distinct date string once; contributions often share dates
+                    df['Date'] = pd.to_datetime(df['Date'], format='%m/%d/%Y', errors='coerce', cache=True)
                     df = df.sort_values(['Date', 'Page'])
                     df = df.drop('Page', axis=1)
                     
@@ -457,14 +749,8 @@ def main():
                     st.markdown('<h3 class="sub-header">📋 Data Preview</h3>', unsafe_allow_html=True)
                     st.dataframe(df.head(10), use_container_width=True)
                     
-                    # Calculate total
-                    total = 0
-                    for amt in df['Amount']:
-                        clean_amt = str(amt).replace('$', '').replace(',', '')
-                        try:
-                            total += float(clean_amt)
-                        except:
-                            pass
+                    # Calculate total (fsum keeps the cents exact over many additions)
+                    total = math.fsum(contributions['Amount'])
                     
                     # Display stats
                     col1, col2, col3 = st.columns(3)
@@ -481,8 +767,18 @@ def main():
                     
                     # Prepare Excel file for download
                     output = io.BytesIO()
-                    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                        df.to_excel(writer, index=False, sheet_name='Schedule_A1')
+                    # xlsxwriter writes plain cell records instead of openpyxl's object tree.
+                    # Not constant_memory mode: pandas writes column by column, and that mode
+                    # flushes each row as soon as a later one is started, dropping cells.
+                    # Dates and amounts are written as real Excel values with a shared cell format,
+                    # displayed the same way as in the app
+                    excel_df = df.assign(Amount=amount_values)
+                    with pd.ExcelWriter(output, engine='xlsxwriter', datetime_format='mm/dd/yyyy') as writer:
+                        excel_df.to_excel(writer, index=False, sheet_name='Schedule_A1')
+                        amount_col = excel_df.columns.get_loc('Amount')
+                        writer.sheets['Schedule_A1'].set_column(
+                            amount_col, amount_col, None, writer.book.add_format({'num_format': '$#,##0.00'})
+                        )
                     
                     output.seek(0)
                     
@@ -498,7 +794,10 @@ def main():
                     )
                     
                     # Also show CSV option
-                    csv = df.to_csv(index=False).encode('utf-8')
+                    # Write the encoded bytes directly instead of building a str and encoding a copy
+                    csv_output = io.BytesIO()
+                    df.to_csv(csv_output, index=False, encoding='utf-8')
+                    csv = csv_output.getvalue()
                     st.download_button(
                         label="📥 Download CSV File",
                         data=csv,
@@ -520,7 +819,8 @@ def main():
         If the PDF is an image (scanned), the app will use OCR. 
         This is slower than standard extraction.
         
-        **Note:** Requires Tesseract and Poppler installed on the host machine.
+        **Note:** Requires Tesseract installed on the host machine.
+        EasyOCR is used instead of Tesseract when a CUDA GPU is available.
         """)
         
         # Add a reset button